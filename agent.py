@@ -1,12 +1,25 @@
 import os
 import re
 import requests
+from concurrent.futures import ThreadPoolExecutor
 import fitz
+import numpy as np
 import pandas as pd
 from bs4 import BeautifulSoup
 from langchain_community.document_loaders import PyPDFLoader
-from sentence_transformers import SentenceTransformer
 from pinecone import Pinecone, ServerlessSpec
+from build_index import C as index_config, get_model
+
+try:
+    import re2  # google-re2: linear-time DFA matching for the whole-document block scan
+except ImportError:
+    re2 = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv  # multi-threaded columnar CSV writer
+except ImportError:
+    pa = None
 
 # -------------------------------------------------------------------
 # 1️⃣  Get latest Sanket PDF link directly from DGMS site
@@ -38,12 +51,11 @@ def get_latest_sanket_link():
 # -------------------------------------------------------------------
 def download_pdf(pdf_url, save_path="latest_sanket.pdf"):
     print(f"⬇ Downloading: {pdf_url}")
-    response = requests.get(pdf_url, stream=True)
-    if response.status_code != 200:
-        raise Exception(f"❌ Failed to download PDF. Status: {response.status_code}")
-
-    with open(save_path, "wb") as f:
-        f.write(response.content)
+    with requests.get(pdf_url, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        with open(save_path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                f.write(chunk)
     print(f"✅ PDF saved as {save_path}")
     return save_path
 
@@ -52,49 +64,58 @@ def download_pdf(pdf_url, save_path="latest_sanket.pdf"):
 # 3️⃣  Extract text and convert PDF → CSV
 # -------------------------------------------------------------------
 def extract_text(path):
-    text = ""
     with fitz.open(path) as pdf:
-        for num, page in enumerate(pdf, start=1):
-            text += page.get_text("text")
-    return text
+        return "".join(page.get_text("text") for page in pdf)
+
+
+# inline (?si) flags so the same pattern compiles under both re2 and re
+_PAT_BLOCK = (re2 or re).compile(r"(?si)(Date\s*-\s.*?averted\.)")
+_PAT_DATE = re.compile(r"Date\s*-\s*(.?)\s+Mine\s-", re.S | re.I)
+_PAT_MINE = re.compile(r"Mine\s*-\s*(.?)\s+Time\s-", re.S | re.I)
+_PAT_TIME = re.compile(r"Time\s*-\s*(.?)\s+Owner\s-", re.S | re.I)
+_PAT_OWNER = re.compile(r"Owner\s*-\s*(.?)\s(?:Dist\.?|District)\s*-\s*", re.S | re.I)
+_PAT_DIST_STATE = re.compile(r"Dist\.\s*-\s*([^,]+),\s*State\s*-\s*([^\n]+)", re.S | re.I)
+_PAT_PERSONS = re.compile(r"Person\(s\)\s*Killed\s*:\s*(.*?)\n\s*While", re.S | re.I)
+_PAT_DESC = re.compile(r"(While.*?)(?=\bHad\b)", re.S | re.I)
+_PAT_PRECAUTION = re.compile(r"(Had.*?averted\.)", re.S | re.I)
+_PAT_WS = re.compile(r"\s+")
 
 
 def extract_accident_blocks(text):
-    pattern = r"(Date\s*-\s.*?averted\.)"
-    matches = re.findall(pattern, text, re.S | re.I)
+    matches = _PAT_BLOCK.findall(text)
     return matches
 
 
 def parse_accident_entry(entry):
     data = {}
 
-    date_match = re.search(r"Date\s*-\s*(.?)\s+Mine\s-", entry, re.S | re.I)
+    date_match = _PAT_DATE.search(entry)
     data["Date"] = date_match.group(1).strip() if date_match else None
 
-    mine_match = re.search(r"Mine\s*-\s*(.?)\s+Time\s-", entry, re.S | re.I)
+    mine_match = _PAT_MINE.search(entry)
     data["Mine"] = mine_match.group(1).strip() if mine_match else None
 
-    time_match = re.search(r"Time\s*-\s*(.?)\s+Owner\s-", entry, re.S | re.I)
+    time_match = _PAT_TIME.search(entry)
     data["Time"] = time_match.group(1).strip() if time_match else None
 
-    owner_match = re.search(r"Owner\s*-\s*(.?)\s(?:Dist\.?|District)\s*-\s*", entry, re.S | re.I)
+    owner_match = _PAT_OWNER.search(entry)
     data["Owner"] = owner_match.group(1).strip() if owner_match else None
 
-    dist_state_match = re.search(r"Dist\.\s*-\s*([^,]+),\s*State\s*-\s*([^\n]+)", entry, re.S | re.I)
+    dist_state_match = _PAT_DIST_STATE.search(entry)
     if dist_state_match:
         data["District"] = dist_state_match.group(1).strip()
         data["State"] = dist_state_match.group(2).strip()
     else:
         data["District"], data["State"] = None, None
 
-    persons_match = re.search(r"Person\(s\)\s*Killed\s*:\s*(.*?)\n\s*While", entry, re.S | re.I)
+    persons_match = _PAT_PERSONS.search(entry)
     data["Persons_Killed"] = persons_match.group(1).strip() if persons_match else None
 
-    desc_match = re.search(r"(While.*?)(?=\bHad\b)", entry, re.S | re.I)
-    data["Description"] = re.sub(r"\s+", " ", desc_match.group(1).strip()) if desc_match else None
+    desc_match = _PAT_DESC.search(entry)
+    data["Description"] = _PAT_WS.sub(" ", desc_match.group(1).strip()) if desc_match else None
 
-    precaution_match = re.search(r"(Had.*?averted\.)", entry, re.S | re.I)
-    data["Precaution"] = re.sub(r"\s+", " ", precaution_match.group(1).strip()) if precaution_match else None
+    precaution_match = _PAT_PRECAUTION.search(entry)
+    data["Precaution"] = _PAT_WS.sub(" ", precaution_match.group(1).strip()) if precaution_match else None
 
     return data
 
@@ -106,25 +127,19 @@ def pdf_to_csv(pdf_path, output_csv="dgms_accidents.csv"):
 
     parsed_records = [parse_accident_entry(b) for b in blocks]
     df = pd.DataFrame(parsed_records)
-    df.to_csv(output_csv, index=False, encoding="utf-8-sig")
+    if pa is not None:
+        pa_csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), output_csv)
+    else:
+        df.to_csv(output_csv, index=False, encoding="utf-8")
     print(f"📁 Saved structured data to {output_csv}")
     return df
 
 # -------------------------------------------------------------------
-# 4️⃣ Convert CSV → JSON
-# -------------------------------------------------------------------
-def csv_to_json(csv_path="dgms_accidents.csv", json_path="dgms_accidents.json"):
-    df = pd.read_csv(csv_path)
-    df.to_json(json_path, orient="records", indent=4)
-    print(f"📄 Converted CSV → JSON at {json_path}")
-    return json_path
-
-
-# -------------------------------------------------------------------
-# 5️⃣ Insert into Pinecone using SentenceTransformer
+# 4️⃣ Insert into Pinecone using SentenceTransformer
 # -------------------------------------------------------------------
-def insert_to_pinecone(json_path):
-    model = SentenceTransformer("all-MiniLM-L6-v2")
+def insert_to_pinecone(df, model=None):
+    if model is None:
+        model = get_model()
     pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
 
     index_name = os.getenv("PINECONE_INDEX")
@@ -132,32 +147,40 @@ def insert_to_pinecone(json_path):
         pc.create_index(
             name=index_name,
             dimension=384,
-            metric="cosine",
+            metric=index_config.METRIC,
             spec=ServerlessSpec(cloud="aws", region="us-east-1"),
         )
 
-    index = pc.Index(index_name)
-    df = pd.read_json(json_path)
-
-    for i, row in df.iterrows():
-        text = f"{row['Description']} {row['Precaution']}"
-        vector = model.encode(text).tolist()
-
-        index.upsert(
-            vectors=[
-                {
-                    "id": str(i),
-                    "values": vector,
-                    "metadata": {
-                        "Date": row.get("Date"),
-                        "Mine": row.get("Mine"),
-                        "District": row.get("District"),
-                        "State": row.get("State"),
-                        "Persons_Killed": row.get("Persons_Killed"),
-                    },
-                }
-            ]
-        )
+    index = pc.Index(index_name, pool_threads=30)
+
+    # Encode everything in one call; sorting by length keeps each mini-batch
+    # padded only to its own longest text.
+    texts = (df["Description"].fillna("") + " " + df["Precaution"].fillna("")).tolist()
+    order = np.argsort([len(t) for t in texts])
+    embeddings = model.encode(
+        [texts[j] for j in order],
+        batch_size=64,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False,
+    )
+    vectors = embeddings[np.argsort(order)].tolist()
+
+    # Pull metadata columns out once instead of boxing every row as a Series
+    meta_cols = ["Date", "Mine", "District", "State", "Persons_Killed"]
+    columns = [df[c].to_numpy() if c in df else [None] * len(df) for c in meta_cols]
+    vectors_meta = [
+        (str(i), vector, dict(zip(meta_cols, values)))
+        for i, vector, *values in zip(df.index, vectors, *columns)
+    ]
+
+    # Fire 100-vector batches concurrently and wait for all of them at the end
+    futures = [
+        index.upsert(vectors=vectors_meta[i:i + 100], async_req=True)
+        for i in range(0, len(vectors_meta), 100)
+    ]
+    for f in futures:
+        f.get()
 
     print(f"✅ Inserted {len(df)} vectors into Pinecone.")
 
@@ -166,11 +189,14 @@ def insert_to_pinecone(json_path):
 # 🚀 MAIN AGENTIC PIPELINE
 # -------------------------------------------------------------------
 def main():
-    pdf_url = get_latest_sanket_link()
-    pdf_path = download_pdf(pdf_url)
-    pdf_to_csv(pdf_path)
-    json_path = csv_to_json()
-    insert_to_pinecone(json_path)
+    # Load the embedding model in the background while the PDF is fetched and parsed
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        model_fut = ex.submit(get_model)
+
+        pdf_url = get_latest_sanket_link()
+        pdf_path = download_pdf(pdf_url)
+        df = pdf_to_csv(pdf_path)
+        insert_to_pinecone(df, model=model_fut.result())
     print("🎯 Full agentic pipeline completed successfully!")
 
 
@@ -8,8 +8,11 @@ Usage:
   build_index.build_index("/mnt/data/dgms_accidents.csv", chunk_per_n_rows=1)
 """
 import os
+import threading
 import time
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import List, Dict, Iterable, Iterator, Tuple
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -18,40 +21,132 @@ load_dotenv()
 class C:
     CSV_PATH = os.getenv("CSV_PATH", "/home/devcontainers/ai-hackathon-cl/data/dgms_accidents.csv")
     EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    # "torch" (default) or "onnx" to run the int8-quantized ONNX export through onnxruntime
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+    EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model_qint8_avx512_vnni.onnx")
     PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
     PINECONE_ENV = os.getenv("PINECONE_ENV")
     PINECONE_INDEX = os.getenv("PINECONE_INDEX", "mine-stats")
     BATCH_SIZE = int(os.getenv("BATCH_SIZE", "64"))
+    EMBED_FP16 = os.getenv("EMBED_FP16", "0") == "1"
+    # >1 shards CPU encoding across that many worker processes (each holds its own model copy)
+    EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "0"))
+    # split the cores between API server processes (WEB_WORKERS) so they don't oversubscribe them
+    TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", str(
+        max(1, min(8, (os.cpu_count() or 1) // max(1, int(os.getenv("WEB_WORKERS", "1"))))))))
+    STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "1000"))  # chunks per embed -> upsert hand-off
+    UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "100"))
+    UPSERT_POOL_THREADS = int(os.getenv("UPSERT_POOL_THREADS", "30"))
+    # embeddings are unit-length, so a plain dot product ranks exactly like cosine without the per-score norm
+    METRIC = "dotproduct"
     DIMENSION = 384
 
+# OpenMP/MKL read this when torch is first imported, so it must be set before the import below
+os.environ.setdefault("OMP_NUM_THREADS", str(C.TORCH_NUM_THREADS))
+
 # Imports (install packages if missing)
+import numpy as np
 import pandas as pd
+import torch
 from sentence_transformers import SentenceTransformer
 import pinecone
 from pinecone import Pinecone, ServerlessSpec
 from pinecone.exceptions import PineconeApiException
 
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv  # multi-threaded columnar CSV reader
+except ImportError:
+    pa = None
+
 # ---------- Helper classes ----------
+def configure_torch_threads():
+    torch.set_num_threads(C.TORCH_NUM_THREADS)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # only settable once, before any inter-op work has started
+        pass
+
+def embedding_device() -> str:
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+def load_embedding_model(model_name=C.EMBEDDING_MODEL):
+    """Load the SentenceTransformer on the configured backend (see C.EMBEDDING_BACKEND)."""
+    configure_torch_threads()
+    if C.EMBEDDING_BACKEND == "onnx":
+        # ORT fuses the transformer graph; the qint8 export uses VNNI int8 matmuls on CPU
+        return SentenceTransformer(model_name, backend="onnx",
+                                   model_kwargs={"file_name": C.EMBEDDING_ONNX_FILE})
+    # place the model explicitly so bulk encodes run on the GPU whenever one is present
+    return SentenceTransformer(model_name, device=embedding_device())
+
+_MODEL = None
+_MODEL_LOCK = threading.Lock()
+
+def get_model():
+    """Process-wide C.EMBEDDING_MODEL instance, loaded on first use and shared by every caller."""
+    global _MODEL
+    with _MODEL_LOCK:
+        if _MODEL is None:
+            print("Loading embedding model:", C.EMBEDDING_MODEL, f"(backend={C.EMBEDDING_BACKEND})")
+            _MODEL = load_embedding_model(C.EMBEDDING_MODEL)
+        return _MODEL
+
 class Embedder:
     def __init__(self, model_name=C.EMBEDDING_MODEL):
-        print("Loading embedding model:", model_name)
-        self.model = SentenceTransformer(model_name)
+        if model_name == C.EMBEDDING_MODEL:
+            self.model = get_model()
+        else:
+            print("Loading embedding model:", model_name, f"(backend={C.EMBEDDING_BACKEND})")
+            self.model = load_embedding_model(model_name)
+        # half precision only pays off on GPU tensor cores; CPU fp16 matmuls are slower than fp32
+        self.fp16 = C.EMBED_FP16 and C.EMBEDDING_BACKEND == "torch" and torch.cuda.is_available()
+        if self.fp16:
+            self.model.to("cuda").half()
+            print("Embedding model cast to fp16 on cuda")
+        self.pool = None  # multi-process pool, started on first embed_batch if enabled
         dim = self.model.get_sentence_embedding_dimension()
         if dim != C.DIMENSION:
             print(f"Adjusting expected dimension from {C.DIMENSION} -> {dim}")
             C.DIMENSION = dim
         print("Embedding model ready. dim =", C.DIMENSION)
 
-    def embed_batch(self, texts: List[str], batch_size: int = C.BATCH_SIZE) -> List[List[float]]:
+    def use_pool(self) -> bool:
+        return C.EMBED_WORKERS > 1 and C.EMBEDDING_BACKEND == "torch" and not torch.cuda.is_available()
+
+    def embed_batch(self, texts: List[str], batch_size: int = C.BATCH_SIZE) -> np.ndarray:
+        """Unit-length float32 embeddings, one row per text."""
+        if self.use_pool():
+            if self.pool is None:
+                workers = min(C.EMBED_WORKERS, os.cpu_count() or 1)
+                print(f"Starting {workers} embedding worker processes")
+                self.pool = self.model.start_multi_process_pool(target_devices=["cpu"] * workers)
+            emb = self.model.encode_multi_process(texts, self.pool, batch_size=batch_size, normalize_embeddings=True)
+            print(f"  embedded {len(texts)}/{len(texts)}")
+            return emb.astype(np.float32, copy=False)
+
         out = []
         n = len(texts)
         for i in range(0, n, batch_size):
             batch = texts[i:i+batch_size]
-            emb = self.model.encode(batch, convert_to_tensor=False, show_progress_bar=False)
-            out.extend([list(map(float, e)) for e in emb])
+            emb = self.model.encode(batch, batch_size=batch_size, convert_to_numpy=True,
+                                    normalize_embeddings=True, show_progress_bar=False)
+            out.append(emb)
             print(f"  embedded {min(i+batch_size,n)}/{n}", end="\r")
         print()
-        return out
+        if not out:
+            return np.empty((0, C.DIMENSION), dtype=np.float32)
+        # Pinecone stores fp32
+        return np.concatenate(out).astype(np.float32, copy=False)
+
+    def close(self):
+        if getattr(self, "pool", None) is not None:
+            SentenceTransformer.stop_multi_process_pool(self.pool)
+            self.pool = None
+
+    def __del__(self):
+        self.close()
 
 # Robust Pinecone wrapper that handles existing indexes and force-recreate option.
 class PineconeStore:
@@ -66,9 +161,10 @@ class PineconeStore:
         self.index_name = index_name
         self.dimension = dimension
 
+        # listed once up front; only re-fetched if creation races with another writer
         try:
-            existing = self.pc.list_indexes()
-            print("Existing Pinecone indexes:", existing)
+            existing = set(self.pc.list_indexes().names())
+            print("Existing Pinecone indexes:", sorted(existing))
         except Exception as e:
             raise RuntimeError("Could not list Pinecone indexes: " + str(e))
 
@@ -77,7 +173,7 @@ class PineconeStore:
             try:
                 self.pc.delete_index(name=index_name)
                 time.sleep(3)
-                existing = [ix for ix in existing if ix != index_name]
+                existing.discard(index_name)
             except Exception as e:
                 print("Warning: delete failed:", e)
 
@@ -87,15 +183,14 @@ class PineconeStore:
                 self.pc.create_index(
                     name=index_name,
                     dimension=dimension,
-                    metric="cosine",
+                    metric=C.METRIC,
                     spec=ServerlessSpec(cloud='aws', region=environment)
                 )
                 time.sleep(3)
             except PineconeApiException as pex:
                 # handle ALREADY_EXISTS gracefully
                 print("PineconeApiException while creating index:", pex)
-                existing = self.pc.list_indexes()
-                if index_name not in existing:
+                if index_name not in self.pc.list_indexes().names():
                     raise
                 else:
                     print("Index appeared after exception; continuing.")
@@ -105,26 +200,41 @@ class PineconeStore:
         else:
             print(f"Index '{index_name}' exists; skipping creation.")
 
-        self.index = self.pc.Index(index_name)
+        # pool_threads sizes the client's thread pool used by async_req upserts
+        self.index = self.pc.Index(index_name, pool_threads=C.UPSERT_POOL_THREADS)
         print("Connected to Pinecone index:", index_name)
 
-    def upsert(self, ids: List[str], embeddings: List[List[float]], metadatas: List[Dict], namespace: str=""):
+    def upsert(self, ids: List[str], embeddings: np.ndarray, metadatas: List[Dict], namespace: str=""):
         assert len(ids) == len(embeddings) == len(metadatas)
-        batch = 100
+        batch = C.UPSERT_BATCH_SIZE
+        # fire all batches concurrently and wait at the end instead of paying one RTT per batch
+        futures = []
         for i in range(0, len(ids), batch):
             chunk_ids = ids[i:i+batch]
-            chunk_emb = embeddings[i:i+batch]
+            chunk_emb = np.asarray(embeddings[i:i+batch], dtype=np.float32).tolist()
             chunk_meta = metadatas[i:i+batch]
             to_upsert = [(chunk_ids[j], chunk_emb[j], chunk_meta[j]) for j in range(len(chunk_ids))]
-            self.index.upsert(vectors=to_upsert, namespace=namespace)
-            print(f"Upserted {i+len(chunk_ids)}/{len(ids)}")
+            futures.append((len(chunk_ids), self.index.upsert(vectors=to_upsert, namespace=namespace, async_req=True)))
+        done = 0
+        for n, f in futures:
+            f.get()
+            done += n
+            print(f"Upserted {done}/{len(ids)}")
 
 # ---------- CSV -> chunks ----------
 def load_csv(csv_path: str):
-    df = pd.read_csv(csv_path, dtype=str, keep_default_na=False, na_values=[''])
-    df = df.fillna("")
-    rows = df.to_dict(orient="records")
-    return df, rows
+    if pa is not None:
+        # Read through Arrow with every column typed as string up front; pandas' pyarrow engine
+        # infers numbers first and would turn times like "3.30" into "3.3". Quoted fields
+        # (Description/Precaution) can span lines, which Arrow only allows when told to.
+        parse = pa_csv.ParseOptions(newlines_in_values=True)
+        with pa_csv.open_csv(csv_path, parse_options=parse) as reader:
+            names = reader.schema.names  # the header exactly as Arrow reads it
+        opts = pa_csv.ConvertOptions(column_types={c: pa.string() for c in names})
+        df = pa_csv.read_csv(csv_path, parse_options=parse, convert_options=opts).to_pandas()
+    else:
+        df = pd.read_csv(csv_path, dtype=str, keep_default_na=False, na_values=[''])
+    return df.fillna("")
 
 def row_to_text(row: Dict[str,str], columns=None):
     if columns is None:
@@ -136,44 +246,59 @@ def row_to_text(row: Dict[str,str], columns=None):
             parts.append(f"{c}: {v}")
     return "\n".join(parts)
 
-def build_index(csv_path: str = None, chunk_per_n_rows: int = 1, force_recreate: bool = False, namespace: str = ""):
-    csv_path = csv_path or C.CSV_PATH
-    if not os.path.exists(csv_path):
-        raise FileNotFoundError(f"CSV not found: {csv_path}")
-    print("Loading CSV:", csv_path)
-    df, rows = load_csv(csv_path)
-
-    # build chunks
-    chunks = []
+def iter_chunks(df: pd.DataFrame, source_csv: str, chunk_per_n_rows: int = 1) -> Iterator[Tuple[str, str, Dict]]:
+    """Yield (id, text, metadata) for each chunk in a single pass over the rows."""
+    columns = list(df.columns)
+    rows = (dict(zip(columns, values)) for values in df.itertuples(index=False, name=None))
     if chunk_per_n_rows <= 1:
         for i, r in enumerate(rows):
             txt = row_to_text(r)
-            meta = dict(r)
-            meta["row_index"] = i
-            meta["source_csv"] = os.path.basename(csv_path)
-            chunks.append({"id": f"row_{i}", "text": txt, "metadata": meta})
+            r["row_index"] = i
+            r["source_csv"] = source_csv
+            yield f"row_{i}", txt, r
     else:
-        for i in range(0, len(rows), chunk_per_n_rows):
-            group = rows[i:i+chunk_per_n_rows]
-            txts = [row_to_text(r) for r in group]
-            text = "\n\n".join(txts)
-            meta = {"row_indexes": list(range(i, min(i+chunk_per_n_rows, len(rows)))), "source_csv": os.path.basename(csv_path)}
-            chunks.append({"id": f"rows_{i}_{min(i+chunk_per_n_rows,len(rows))-1}", "text": text, "metadata": meta})
+        for i in range(0, len(df), chunk_per_n_rows):
+            group = list(islice(rows, chunk_per_n_rows))
+            text = "\n\n".join(row_to_text(r) for r in group)
+            end = i + len(group)
+            meta = {"row_indexes": list(range(i, end)), "source_csv": source_csv}
+            yield f"rows_{i}_{end-1}", text, meta
 
-    print(f"Created {len(chunks)} chunks")
+def batched(items: Iterable, n: int) -> Iterator[list]:
+    it = iter(items)
+    while batch := list(islice(it, n)):
+        yield batch
 
-    # embed
-    embedder = Embedder()
-    texts = [c["text"] for c in chunks]
-    embeddings = embedder.embed_batch(texts)
+def build_index(csv_path: str = None, chunk_per_n_rows: int = 1, force_recreate: bool = False, namespace: str = ""):
+    csv_path = csv_path or C.CSV_PATH
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"CSV not found: {csv_path}")
+    print("Loading CSV:", csv_path)
+    df = load_csv(csv_path)
 
-    # init pinecone and upsert
+    embedder = Embedder()
     pine = PineconeStore(api_key=C.PINECONE_API_KEY, environment=C.PINECONE_ENV, index_name=C.PINECONE_INDEX,
                         dimension=C.DIMENSION, force_recreate=force_recreate)
-    ids = [c["id"] for c in chunks]
-    metas = [c["metadata"] for c in chunks]
-    print("Upserting vectors...")
-    pine.upsert(ids, embeddings, metas, namespace=namespace)
+
+    # Stream chunks through embed -> upsert; a single worker upserts batch k while batch k+1 is embedded.
+    print("Embedding and upserting vectors...")
+    total = 0
+    pending = None
+    with ThreadPoolExecutor(max_workers=1) as upserter:
+        try:
+            chunks = iter_chunks(df, os.path.basename(csv_path), chunk_per_n_rows)
+            for batch in batched(chunks, C.STREAM_BATCH_SIZE):
+                ids, texts, metas = map(list, zip(*batch))
+                embeddings = embedder.embed_batch(texts)
+                if pending is not None:
+                    pending.result()
+                pending = upserter.submit(pine.upsert, ids, embeddings, metas, namespace=namespace)
+                total += len(ids)
+            if pending is not None:
+                pending.result()
+        finally:
+            embedder.close()
+    print(f"Indexed {total} chunks")
     print("Index build complete.")
 
 # Allow running directly for quick test when executing file
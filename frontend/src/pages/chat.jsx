@@ -71,7 +71,7 @@ export const Chat = () => {
     try {
       const payload = {
         question: q,
-        top_k: 43,
+        // top_k left to the server default (6); /query-rag caps it at MAX_TOP_K
         namespace: namespace || ""
       };
 
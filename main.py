@@ -1,14 +1,49 @@
 # app_with_rag.py
+import asyncio
 import json
 import os
+import re
 import traceback
-from collections import defaultdict
-from datetime import datetime
+from collections import Counter
+from functools import lru_cache
+import numpy as np
+import pandas as pd
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, List
+
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional; without it the kernels below run as plain Python
+    def njit(*args, **kwargs):
+        return lambda fn: fn
+
+try:
+    import ahocorasick  # pyahocorasick: single-pass multi-keyword matching for classify_by_cause
+except ImportError:
+    ahocorasick = None
+
+try:
+    import orjson  # faster JSON encode/decode for the dataset, API responses and LLM prompts
+    from fastapi.responses import ORJSONResponse
+except ImportError:
+    orjson = None
+
+
+def dumps(obj) -> str:
+    """Compact JSON text (orjson when installed, stdlib json otherwise)."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(",", ":"))
+
+
+def loads(text):
+    return orjson.loads(text) if orjson is not None else json.loads(text)
 
 # Llama index / Gemini import from your original file
 from llama_index.llms.google_genai import GoogleGenAI
@@ -23,11 +58,20 @@ llm = None
 if GOOGLE_API_KEY:
     llm = GoogleGenAI(model="gemini-2.5-flash", api_key=GOOGLE_API_KEY)
 
+# LLM cause classification: records per prompt and prompts in flight at once (keep under the Gemini rate tier)
+LLM_CHUNK_SIZE = int(os.getenv("LLM_CHUNK_SIZE", "100"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+
 # -----------------------------------------------------
 # Load dataset (original)
 # -----------------------------------------------------
-with open("dgms.json", "r", encoding="utf-8") as f:
-    data = json.load(f)
+with open("dgms.json", "rb") as f:
+    data = loads(f.read())
+
+# Column-oriented copy for the count classifiers; `data` stays for the record-level cause examples.
+# dgms.json was exported from a BOM-prefixed CSV, so its first key is "\ufeffDate"; strip that so
+# the year classifier finds the Date column.
+df = pd.DataFrame(data).rename(columns=lambda c: c.lstrip("\ufeff"))
 
 # -----------------------------------------------------
 # Try import of build_index and query_bot modules (RAG)
@@ -49,7 +93,8 @@ except Exception as e:
 # -----------------------------------------------------
 # Initialize FastAPI app (original)
 # -----------------------------------------------------
-app = FastAPI(title="DGMS Accident Data Classifier + RAG")
+app = FastAPI(title="DGMS Accident Data Classifier + RAG",
+              default_response_class=ORJSONResponse if orjson is not None else JSONResponse)
 
 # Enable CORS for frontend (React on localhost:5173)
 app.add_middleware(
@@ -63,51 +108,162 @@ app.add_middleware(
 # -----------------------------------------------------
 # Helper functions (original)
 # -----------------------------------------------------
-def classify_by_state(data):
-    """Return accidents grouped by state."""
-    state_counts = defaultdict(int)
-    for item in data:
-        state = item.get("State") or item.get("state") or "Unknown"
-        state_counts[state] += 1
-    return dict(state_counts)
+def first_field(df, names, default):
+    """Column-wise `rec.get(a) or rec.get(b) or default` over the records frame."""
+    out = pd.Series(default, index=df.index, dtype=object)
+    for name in reversed(names):
+        if name in df.columns:
+            col = df[name]
+            out = col.where(col.notna() & (col != ""), out)
+    return out
 
 
-def classify_by_year(data):
-    """Return accidents grouped by year (handles '16/05/15' etc)."""
-    year_counts = defaultdict(int)
-
-    for item in data:
-        date_str = str(item.get("Date") or item.get("date") or "").strip()
-        year = "2015"
+def classify_by_state(df):
+    """Return accidents grouped by state."""
+    return first_field(df, ("State", "state"), "Unknown").value_counts(sort=False).to_dict()
 
-        if not date_str or date_str.lower() == "2015":
-            year_counts[year] += 1
-            continue
 
-        try:
-            # Try formats: DD/MM/YY, DD-MM-YYYY, YYYY/MM/DD
-            if "-" in date_str and len(date_str.split("-")[-1]) == 4:
-                date_obj = datetime.strptime(date_str, "%d-%m-%Y")
-            elif "/" in date_str and len(date_str.split("/")[-1]) == 2:
-                date_obj = datetime.strptime(date_str, "%d/%m/%y")
-            elif "/" in date_str and len(date_str.split("/")[-1]) == 4:
-                date_obj = datetime.strptime(date_str, "%Y/%m/%d")
-            else:
-                raise ValueError("Unrecognized format")
-            
-            year = str(date_obj.year)
-
-        except Exception:
-            parts = [p for p in date_str.replace("-", "/").split("/") if p.isdigit()]
-            if parts and len(parts[-1]) in (2, 4):
-                yy = int(parts[-1])
-                year = str(2000 + yy) if yy < 50 else str(1900 + yy)
+@njit(cache=True)
+def fallback_years(buf, ends):
+    """
+    Year from the last all-digit '/'- or '-'-separated part of each string (two-digit
+    years pivot at 50), or -1 when that part is missing or not 2/4 digits long.
+    `buf` holds the strings' ASCII bytes back to back; `ends` their cumulative end offsets.
+    """
+    out = np.full(len(ends), -1, dtype=np.int64)
+    start = 0
+    for i in range(len(ends)):
+        end = ends[i]
+        last_len, last_val = 0, 0
+        part_len, part_val, digits = 0, 0, True
+        for j in range(start, end + 1):
+            if j == end or buf[j] == 47 or buf[j] == 45:  # end of string, '/', '-'
+                if part_len > 0 and digits:
+                    last_len, last_val = part_len, part_val
+                part_len, part_val, digits = 0, 0, True
             else:
-                year = "2015"
+                c = int(buf[j])
+                if 48 <= c <= 57:
+                    if part_len < 4:
+                        part_val = part_val * 10 + (c - 48)
+                else:
+                    digits = False
+                part_len += 1
+        if last_len == 2 or last_len == 4:
+            out[i] = last_val + (2000 if last_val < 50 else 1900)
+        start = end
+    return out
+
+
+# Picks the strptime format by shape in one pass, in the same precedence as before: a 4-char part after
+# the last "-" means DD-MM-YYYY, else a 2-char part after the last "/" DD/MM/YY, else a 4-char one YYYY/MM/DD.
+_DATE_RE = re.compile(r"(?s)^(?:(.*-[^-]{4})|(.*/[^/]{2})|(.*/[^/]{4}))\Z")
+_DATE_FORMATS = ("%d-%m-%Y", "%d/%m/%y", "%Y/%m/%d")
+
+
+def classify_by_year(df):
+    """Return accidents grouped by year (handles '16/05/15' etc)."""
+    dates = first_field(df, ("Date", "date"), "").astype(str).str.strip()
+    years = pd.Series(2015, index=dates.index)
+    default = (dates == "") | (dates.str.lower() == "2015")
+
+    # Try formats: DD-MM-YYYY, DD/MM/YY, YYYY/MM/DD (first matching shape wins)
+    shapes = dates[~default].str.extract(_DATE_RE)
+    ok = pd.Series(False, index=dates.index)
+    for col, fmt in enumerate(_DATE_FORMATS):
+        matched = shapes[col].dropna()
+        if not matched.empty:
+            parsed = pd.to_datetime(matched, format=fmt, errors="coerce").dropna()
+            years[parsed.index] = parsed.dt.year
+            ok[parsed.index] = True
+
+    # Fallback for rows no format parsed: scan the packed bytes in one compiled pass
+    fallback = ~ok & ~default
+    if fallback.any():
+        tails = dates[fallback].tolist()
+        buf = np.frombuffer("".join(tails).encode("ascii", "replace"), dtype=np.uint8)
+        ends = np.cumsum([len(t) for t in tails])
+        fb = fallback_years(buf, ends)
+        hit = fb >= 0
+        years[dates.index[fallback][hit]] = fb[hit]
+
+    # count on the int column; only the handful of distinct years are turned into string keys
+    return dict(sorted((str(year), n) for year, n in years.value_counts().items()))
+
+
+# keyword -> category mapping (lowercase); earlier entries win when several match
+CAUSE_KEYWORDS = {
+    "fall of roof": "Fall of Roof",
+    "roof fall": "Fall of Roof",
+    "fall of side": "Fall of Roof",
+    "slip": "Fall of Roof",
+    "collapse": "Fall of Roof",
+    "machine": "Machinery Accident",
+    "machinery": "Machinery Accident",
+    "crush": "Machinery Accident",
+    "caught in": "Machinery Accident",
+    "entangled": "Machinery Accident",
+    "explosion": "Explosion",
+    "blast": "Explosion",
+    "gas": "Explosion",
+    "electr": "Electrical Accident",   # matches electrical, electricity, etc
+    "short circuit": "Electrical Accident",
+    "fire": "Fire Incident",
+    "burn": "Fire Incident",
+    "transport": "Transportation Accident",
+    "vehicle": "Transportation Accident",
+    "truck": "Transportation Accident",
+    "trolley": "Transportation Accident",
+    "collision": "Transportation Accident",
+    "diesel": "Machinery Accident",
+    "compressor": "Machinery Accident",
+    "fall from": "Fall of Roof",
+    "fall": "Fall of Roof",
+    "gas leak": "Explosion",
+    "methane": "Explosion",
+    "oxygen deficiency": "Explosion",
+    "inrush": "Fall of Roof",
+}
+
+# A single automaton pass finds every keyword in a text at once. Values carry the
+# keyword's position in CAUSE_KEYWORDS so the first-listed match still wins.
+_cause_automaton = None
+if ahocorasick is not None:
+    _cause_automaton = ahocorasick.Automaton()
+    for priority, (kw, cat) in enumerate(CAUSE_KEYWORDS.items()):
+        _cause_automaton.add_word(kw, (priority, cat))
+    _cause_automaton.make_automaton()
+
+
+def match_cause_keyword(text):
+    """Return the category of the first CAUSE_KEYWORDS entry found in (lowercase) text, or None."""
+    if _cause_automaton is not None:
+        hit = min((v for _, v in _cause_automaton.iter(text)), default=None)
+        return hit[1] if hit else None
+    for kw, cat in CAUSE_KEYWORDS.items():
+        if kw in text:
+            return cat
+    return None
+
+
+async def llm_classify_records(payload, categories):
+    """
+    Classify [{idx, text}, ...] with the LLM, LLM_CHUNK_SIZE records per prompt and at most
+    LLM_MAX_CONCURRENCY prompts in flight. Returns the merged [{idx, category}, ...] list.
+    """
+    sem = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
 
-        year_counts[year] += 1
+    async def classify_chunk(chunk):
+        prompt = f"""You are an expert mining safety analyst. Classify each record into one of these categories: {', '.join(categories)}.
+            Return a JSON list of objects like: {{ "idx": <index>, "category": "<one of categories>" }}.
+            Here are the records: {dumps(chunk)}"""
+        async with sem:
+            resp = await llm.acomplete(prompt)
+        return loads(resp.text.strip())
 
-    return dict(sorted(year_counts.items()))
+    chunks = [payload[i:i + LLM_CHUNK_SIZE] for i in range(0, len(payload), LLM_CHUNK_SIZE)]
+    results = await asyncio.gather(*(classify_chunk(c) for c in chunks))
+    return [m for mapped in results for m in mapped]
 
 
 def classify_by_cause(data):
@@ -135,40 +291,6 @@ def classify_by_cause(data):
         "Other"
     ]
 
-    # keyword -> category mapping (lowercase)
-    keyword_map = {
-        "fall of roof": "Fall of Roof",
-        "roof fall": "Fall of Roof",
-        "fall of side": "Fall of Roof",
-        "slip": "Fall of Roof",
-        "collapse": "Fall of Roof",
-        "machine": "Machinery Accident",
-        "machinery": "Machinery Accident",
-        "crush": "Machinery Accident",
-        "caught in": "Machinery Accident",
-        "entangled": "Machinery Accident",
-        "explosion": "Explosion",
-        "blast": "Explosion",
-        "gas": "Explosion",
-        "electr": "Electrical Accident",   # matches electrical, electricity, etc
-        "short circuit": "Electrical Accident",
-        "fire": "Fire Incident",
-        "burn": "Fire Incident",
-        "transport": "Transportation Accident",
-        "vehicle": "Transportation Accident",
-        "truck": "Transportation Accident",
-        "trolley": "Transportation Accident",
-        "collision": "Transportation Accident",
-        "diesel": "Machinery Accident",
-        "compressor": "Machinery Accident",
-        "fall from": "Fall of Roof",
-        "fall": "Fall of Roof",
-        "gas leak": "Explosion",
-        "methane": "Explosion",
-        "oxygen deficiency": "Explosion",
-        "inrush": "Fall of Roof",
-    }
-
     # helper to extract text content from a record
     def extract_text_fields(rec):
         texts = []
@@ -184,45 +306,40 @@ def classify_by_cause(data):
                     texts.append(str(rec.get(k)))
         return " ".join(texts).strip()
 
-    counts = defaultdict(int)
     examples = {cat: [] for cat in categories}
 
     # Optionally use LLM if configured and desired (disabled by default)
     USE_LLM = False
 
     if USE_LLM and llm:
-        # Build a small prompt to classify - but keep it limited to avoid rate limits
-        # We'll call LLM on batches to get predicted categories, fallback to heuristic for failures
+        # Classify in fixed-size chunks issued concurrently (bounded to stay within rate limits)
+        # so no single prompt outgrows the context window; fallback to heuristic for failures
         try:
             # prepare a small JSON input with index and text snippet
             sample_payload = []
             for idx, rec in enumerate(data):
                 txt = extract_text_fields(rec)
                 sample_payload.append({"idx": idx, "text": txt[:1000]})
-            prompt = f"""You are an expert mining safety analyst. Classify each record into one of these categories: {', '.join(categories)}.
-            Return a JSON list of objects like: {{ "idx": <index>, "category": "<one of categories>" }}.
-            Here are the records: {json.dumps(sample_payload)}"""
-            resp = llm.complete(prompt)
-            text = resp.text.strip()
-            mapped = json.loads(text)
+            mapped = asyncio.run(llm_classify_records(sample_payload, categories))
             # mapped = list of {idx, category}
+            llm_counts = Counter()
             for m in mapped:
                 idx = int(m.get("idx"))
                 cat = m.get("category") or "Other"
                 if cat not in categories:
                     cat = "Other"
-                counts[cat] += 1
+                llm_counts[cat] += 1
                 if len(examples[cat]) < 6:
                     rec = data[idx]
                     snippet = extract_text_fields(rec)[:300]
                     examples[cat].append({"idx": idx, "snippet": snippet, "record": rec})
-            return {"counts": dict(counts), "examples": examples}
+            return {"counts": dict(llm_counts), "examples": examples}
         except Exception as e:
             # fallback to heuristic below
             print("LLM classification failed, falling back to heuristic:", e)
 
     # Heuristic (keyword-based) classification
-    for idx, rec in enumerate(data):
+    def assign_category(rec):
         # prefer explicit Cause field if present and non-empty
         explicit = (rec.get("Cause") or rec.get("cause") or "").strip()
         assigned = None
@@ -252,15 +369,15 @@ def classify_by_cause(data):
         if not assigned:
             text = extract_text_fields(rec).lower()
             # check keyword map in order of specificity
-            for kw, cat in keyword_map.items():
-                if kw in text:
-                    assigned = cat
-                    break
+            assigned = match_cause_keyword(text)
         if not assigned:
             assigned = "Other"
+        return assigned
 
-        counts[assigned] += 1
-        # keep a few representative examples per category
+    assigned_all = [assign_category(rec) for rec in data]
+    counts = Counter(assigned_all)  # counting loop runs in C
+    # keep a few representative examples per category
+    for idx, (rec, assigned) in enumerate(zip(data, assigned_all)):
         if len(examples[assigned]) < 6:
             snippet = extract_text_fields(rec)[:300]
             examples[assigned].append({"idx": idx, "snippet": snippet, "record": rec})
@@ -271,14 +388,73 @@ def classify_by_cause(data):
     return {"counts": counts, "examples": examples}
 
 
-def classify_by_district(data):
+def classify_by_district(df):
     """Return nested data: {state: {district: count}}"""
-    district_data = defaultdict(lambda: defaultdict(int))
-    for item in data:
-        state = item.get("State") or "Unknown"
-        district = item.get("District") or "Unknown"
-        district_data[state][district] += 1
-    return {k: dict(v) for k, v in district_data.items()}
+    pairs = pd.DataFrame({
+        "State": first_field(df, ("State",), "Unknown"),
+        "District": first_field(df, ("District",), "Unknown"),
+    })
+    sizes = pairs.groupby(["State", "District"], sort=False).size()
+    # pivot the (state, district) counts in one pass instead of a second groupby per state
+    out = {}
+    for (state, district), n in sizes.items():
+        out.setdefault(state, {})[district] = n
+    return out
+
+
+# The dataset is read-only once loaded, so each grouping only has to be computed once.
+@lru_cache(maxsize=1)
+def state_counts():
+    return classify_by_state(df)
+
+
+@lru_cache(maxsize=1)
+def year_counts():
+    return classify_by_year(df)
+
+
+@lru_cache(maxsize=1)
+def cause_counts():
+    return classify_by_cause(data)
+
+
+@lru_cache(maxsize=1)
+def district_counts():
+    return classify_by_district(df)
+
+
+@lru_cache(maxsize=1)
+def state_pattern():
+    # one alternation over the dataset's known states; longest first so a longer name wins over a prefix of it
+    names = sorted((s for s in state_counts() if s and s != "Unknown"), key=len, reverse=True)
+    if not names:
+        return None
+    return re.compile(r"\b(" + "|".join(map(re.escape, names)) + r")\b", re.IGNORECASE)
+
+
+def question_filter(question: str):
+    """Pinecone metadata prefilter for the states named in the question, or None."""
+    pattern = state_pattern()
+    if pattern is None:
+        return None
+    canonical = {s.lower(): s for s in state_counts()}
+    states = sorted({canonical[m.lower()] for m in pattern.findall(question)})
+    return {"State": {"$in": states}} if states else None
+
+
+@app.on_event("startup")
+async def warm_classification_caches():
+    # Fill every cache at boot so no request pays for the first computation. Run off the event
+    # loop: classify_by_cause drives its own loop for the (optional) LLM calls.
+    for counts in (state_counts, year_counts, cause_counts, district_counts):
+        await run_in_threadpool(counts)
+
+
+@app.on_event("startup")
+async def warm_rag_clients():
+    # Load the query embedder and connect to Pinecone once, before the first /query-rag request
+    if query_bot is not None:
+        await run_in_threadpool(query_bot.warm_up)
 
 
 # -----------------------------------------------------
@@ -291,22 +467,22 @@ def root():
 
 @app.get("/classify_by_state")
 def api_state():
-    return {"data": classify_by_state(data)}
+    return {"data": state_counts()}
 
 
 @app.get("/classify_by_year")
 def api_year():
-    return {"data": classify_by_year(data)}
+    return {"data": year_counts()}
 
 
 @app.get("/classify_by_cause")
 def api_cause():
-    return {"data": classify_by_cause(data)}
+    return {"data": cause_counts()}
 
 
 @app.get("/classify_by_district")
 def api_district():
-    return {"data": classify_by_district(data)}
+    return {"data": district_counts()}
 
 
 # -----------------------------------------------------
@@ -323,6 +499,8 @@ class QueryRAGRequest(BaseModel):
     question: str
     top_k: Optional[int] = 6
     namespace: Optional[str] = ""
+    namespaces: Optional[List[str]] = None
+    stream: Optional[bool] = False
 
 
 @app.get("/health")
@@ -339,7 +517,7 @@ def health():
 
 
 @app.post("/build-index")
-def build_index_endpoint(req: BuildIndexRequest):
+async def build_index_endpoint(req: BuildIndexRequest):
     """
     Trigger building (or updating) the Pinecone index from a CSV file.
     - csv_path: path to CSV on server (optional, default set via env)
@@ -355,24 +533,42 @@ def build_index_endpoint(req: BuildIndexRequest):
         raise HTTPException(status_code=400, detail=f"CSV not found: {csv_path}")
 
     try:
-        # call the build_index function from build_index.py
-        build_index.build_index(csv_path=csv_path,
+        # call the build_index function from build_index.py (CPU/IO heavy, so off the event loop)
+        await run_in_threadpool(build_index.build_index,
+                                csv_path=csv_path,
                                 chunk_per_n_rows=req.chunk_per_n_rows or 1,
                                 force_recreate=bool(req.force_recreate),
                                 namespace=req.namespace or "")
+        if query_bot is not None:
+            # answers cached before the rebuild may cite stale rows
+            query_bot.clear_answer_cache()
         return {"status": "ok", "message": f"Index build triggered for {csv_path}"}
     except Exception as e:
         tb = traceback.format_exc()
         raise HTTPException(status_code=500, detail=f"Failed to build index: {e}\n{tb}")
 
 
+async def sse_answer(question, top_k, namespace, flt):
+    # one `data:` event per generated chunk (JSON-encoded so newlines survive), then [DONE]
+    try:
+        async for text in query_bot.stream_answer_async(question, top_k=top_k, namespace=namespace, filter=flt):
+            yield f"data: {dumps({'text': text})}\n\n"
+    except Exception as e:
+        # headers are already sent, so failures have to travel in-band
+        yield f"event: error\ndata: {dumps({'detail': f'Query failed: {e}'})}\n\n"
+        return
+    yield "data: [DONE]\n\n"
+
+
 @app.post("/query-rag")
-def query_rag_endpoint(req: QueryRAGRequest):
+async def query_rag_endpoint(req: QueryRAGRequest):
     """
     Query the RAG index and generate an answer using Gemini.
     - question: the natural language question
-    - top_k: number of retrieved rows to pass to generator
+    - top_k: number of retrieved rows to pass to generator (capped at MAX_TOP_K, default 20)
     - namespace: Pinecone namespace (optional)
+    - namespaces: several Pinecone namespaces to search in parallel (optional, overrides namespace)
+    - stream: send the answer as server-sent events while Gemini generates it (optional)
     """
     if query_bot is None:
         raise HTTPException(status_code=500, detail=f"query_bot module not available: {_query_bot_err}")
@@ -381,9 +577,16 @@ def query_rag_endpoint(req: QueryRAGRequest):
     if not question:
         raise HTTPException(status_code=400, detail="Question cannot be empty.")
 
+    top_k = req.top_k or 6
+    namespace = req.namespaces or req.namespace or ""
+    flt = question_filter(question)
+
+    if req.stream and query_bot.Cq.GEMINI_API_KEY:
+        return StreamingResponse(sse_answer(question, top_k, namespace, flt), media_type="text/event-stream")
+
     try:
-        # call query_bot.answer_question which returns a text answer (or fallback dict)
-        answer = query_bot.answer_question(question, top_k=req.top_k or 6, namespace=req.namespace or "")
+        # call query_bot.answer_question_async which returns a text answer (or fallback dict)
+        answer = await query_bot.answer_question_async(question, top_k=top_k, namespace=namespace, filter=flt)
         return {"status": "ok", "question": question, "answer": answer}
     except Exception as e:
         tb = traceback.format_exc()
@@ -395,5 +598,15 @@ def query_rag_endpoint(req: QueryRAGRequest):
 # -----------------------------------------------------
 if __name__ == "__main__":
     import uvicorn
-    print("Starting DGMS API with RAG endpoints on http://127.0.0.1:8000")
-    uvicorn.run(app, host="127.0.0.1", port=8000)
+    # Each worker is its own process with its own dataset copy, classification caches, query
+    # embedder and answer cache (a rebuild only clears the worker that ran it; the rest wait for
+    # ANSWER_CACHE_TTL), so size WEB_WORKERS to fit the model in RAM once per worker. build_index
+    # reads the same variable to split the torch threads between workers.
+    workers = int(os.getenv("WEB_WORKERS", "1"))
+    print(f"Starting DGMS API with RAG endpoints on http://127.0.0.1:8000 ({workers} workers)")
+    if workers > 1:
+        # worker processes need an import string; each one imports main itself
+        uvicorn.run("main:app", host="127.0.0.1", port=8000, workers=workers)
+    else:
+        # serve the app already built here instead of importing main (and dgms.json) a second time
+        uvicorn.run(app, host="127.0.0.1", port=8000)
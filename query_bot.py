@@ -3,11 +3,20 @@
 Query the Pinecone index and generate an answer with Gemini.
 Functions:
   - answer_question(question: str, top_k: int = 6) -> str
+  - answer_question_async(question: str, top_k: int = 6) -> str  (awaitable, for async servers)
+  - stream_answer_async(question: str, top_k: int = 6) -> async iterator of answer text chunks
 Usage:
   import query_bot
   query_bot.answer_question("How many fatal accidents in 2015?")
 """
+import asyncio
+import json
 import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import AsyncIterator, List, Union
+import numpy as np
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -18,11 +27,20 @@ class Cq:
     PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
     PINECONE_ENV = os.getenv("PINECONE_ENV")
     PINECONE_INDEX = os.getenv("PINECONE_INDEX", "mine-stats")
-    TOP_K = int(os.getenv("TOP_K", "43"))
+    # every retrieved row goes into the Gemini prompt, so top_k drives input tokens and time-to-first-token
+    TOP_K = int(os.getenv("TOP_K", "6"))
+    MAX_TOP_K = int(os.getenv("MAX_TOP_K", "20"))
+    EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+    ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+    # clear_answer_cache() only reaches the process that ran /build-index; the TTL bounds how long
+    # other server workers can keep serving answers from before a rebuild
+    ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "600"))
     DIMENSION = 384
 
 # Imports
-from sentence_transformers import SentenceTransformer
+# build_index first: it sets OMP_NUM_THREADS before torch is imported, and owns the embedding
+# backend/device/thread settings (EMBEDDING_BACKEND, EMBEDDING_ONNX_FILE, TORCH_NUM_THREADS)
+from build_index import C as index_config, get_model, load_embedding_model
 from pinecone import Pinecone
 import google.generativeai as genai
 import pinecone
@@ -35,15 +53,47 @@ if Cq.GEMINI_API_KEY:
 # embedder (same model)
 class EmbedderQ:
     def __init__(self, model_name=Cq.EMBEDDING_MODEL):
-        print("Loading embedder:", model_name)
-        self.model = SentenceTransformer(model_name)
+        if model_name == index_config.EMBEDDING_MODEL:
+            # same process-wide instance /build-index encodes with, so the API holds one copy
+            self.model = get_model()
+        else:
+            print("Loading embedder:", model_name)
+            self.model = load_embedding_model(model_name)
         dim = self.model.get_sentence_embedding_dimension()
         if dim != Cq.DIMENSION:
             print("Adjusting dimension", dim)
             Cq.DIMENSION = dim
 
+    def embed_batch(self, texts: List[str]):
+        # one encode call for many texts keeps the transformer busy with full batches
+        return self.model.encode(texts, batch_size=64, convert_to_numpy=True, normalize_embeddings=True)
+
     def embed(self, text: str):
-        return list(map(float, self.model.encode([text], convert_to_tensor=False)[0]))
+        return self.embed_batch([text])[0]
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+def get_embedder() -> "EmbedderQ":
+    """Process-wide EmbedderQ, loaded on first use instead of once per question."""
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            _embedder = EmbedderQ()
+        return _embedder
+
+# Repeated questions skip the forward pass; the array is made read-only so cached entries can't be mutated
+@lru_cache(maxsize=Cq.EMBED_CACHE_SIZE)
+def embed_query(text: str) -> np.ndarray:
+    vec = get_embedder().embed(text)
+    vec.flags.writeable = False
+    return vec
+
+def to_query_vector(vector) -> list:
+    # ndarrays are converted once, at the serialization boundary; lists are taken as already prepared
+    if isinstance(vector, np.ndarray):
+        vector = vector.tolist()
+    return vector
 
 # Pinecone connector
 class PineconeReader:
@@ -55,8 +105,10 @@ class PineconeReader:
         self.index = self.pc.Index(index_name)
         print("Connected to Pinecone index:", index_name)
 
-    def query(self, vector, top_k=6, namespace=""):
-        res = self.index.query(vector=vector, top_k=top_k, include_metadata=True, namespace=namespace)
+    def query(self, vector, top_k=6, namespace="", filter=None):
+        # filter: Pinecone metadata filter, e.g. {"State": {"$in": ["Rajasthan"]}}, applied before the ANN search
+        vector = to_query_vector(vector)
+        res = self.index.query(vector=vector, top_k=top_k, include_metadata=True, namespace=namespace, filter=filter)
         # Pinecone may return matches under res["matches"] or different structure
         matches = res.get("matches") or res.get("results") or []
         # Normalize
@@ -69,22 +121,51 @@ class PineconeReader:
             })
         return out
 
+    async def aquery(self, vector, top_k=6, namespace="", filter=None):
+        # the Pinecone client is blocking; run it on a worker thread so the event loop stays free
+        return await asyncio.to_thread(self.query, vector, top_k, namespace, filter)
+
+    async def aquery_many(self, vector, top_k=6, namespaces=("",), filter=None):
+        # query every namespace concurrently (wall time ~ slowest query) and keep the best top_k overall
+        vector = to_query_vector(vector)
+        results = await asyncio.gather(*(self.aquery(vector, top_k, ns, filter) for ns in namespaces))
+        merged = [m for matches in results for m in matches]
+        merged.sort(key=lambda m: m["score"] or 0.0, reverse=True)
+        return merged[:top_k]
+
+_reader = None
+_reader_lock = threading.Lock()
+
+def get_reader() -> "PineconeReader":
+    """Process-wide PineconeReader so the client/index handshake happens once per process."""
+    global _reader
+    with _reader_lock:
+        if _reader is None:
+            _reader = PineconeReader(Cq.PINECONE_API_KEY, Cq.PINECONE_ENV, Cq.PINECONE_INDEX)
+        return _reader
+
+def warm_up():
+    """Load the embedder and connect to Pinecone ahead of the first question (e.g. at server start).
+    Failures are only reported: a missing key shouldn't stop the app from booting."""
+    for name, init in (("embedder", get_embedder), ("pinecone reader", get_reader)):
+        try:
+            init()
+        except Exception as e:
+            print(f"query_bot warm-up: {name} unavailable:", e)
+
 # Build the Gemini prompt from retrieved rows
 def build_prompt(question: str, retrieved: list):
-    context_pieces = []
-    for r in retrieved:
+    context_pieces = [None] * len(retrieved)
+    for i, r in enumerate(retrieved):
         meta = r.get("metadata", {})
         # prefer flattened text if available
         if "text" in meta and isinstance(meta["text"], str):
             snippet = meta["text"][:1500]
         else:
-            kvs = []
-            for k,v in meta.items():
-                kvs.append(f"{k}: {v}")
-            snippet = "; ".join(kvs)[:1500]
+            snippet = "; ".join(f"{k}: {v}" for k, v in meta.items())[:1500]
         src = meta.get("source_csv", meta.get("source", "csv"))
         idx = meta.get("row_index", meta.get("row_indexes", meta.get("id", "?")))
-        context_pieces.append(f"[Source:{src} id:{idx}]\n{snippet}")
+        context_pieces[i] = f"[Source:{src} id:{idx}]\n{snippet}"
     context = "\n\n".join(context_pieces)
     prompt = f"""You are an expert analyst of mine safety statistics using only the retrieved CSV rows below.
 Context:
@@ -100,23 +181,42 @@ Instructions:
 Answer:"""
     return prompt
 
-def answer_question(question: str, top_k: int = Cq.TOP_K, namespace: str = "") -> str:
-    # embed query
-    embedder = EmbedderQ()
-    q_emb = embedder.embed(question)
+# LRU of generated answers keyed by (normalized question, top_k, namespaces); a hit skips
+# embedding, retrieval and generation entirely. Entries expire after Cq.ANSWER_CACHE_TTL seconds.
+# Guarded because sync callers may use threads.
+_answer_cache: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (expires_at, text)
+_answer_cache_lock = threading.Lock()
 
-    # connect to pinecone
-    reader = PineconeReader(api_key=Cq.PINECONE_API_KEY, environment=Cq.PINECONE_ENV, index_name=Cq.PINECONE_INDEX)
-    matches = reader.query(q_emb, top_k=top_k, namespace=namespace)
+def answer_cache_key(question: str, top_k: int, namespace, filter=None) -> tuple:
+    ns = namespace if isinstance(namespace, str) else tuple(namespace)
+    flt = json.dumps(filter, sort_keys=True) if filter else None
+    return (" ".join(question.lower().split()), top_k, ns, flt)
 
-    # prepare prompt and call Gemini
-    prompt = build_prompt(question, matches)
-    if not Cq.GEMINI_API_KEY:
-        # If Gemini key missing, return the retrieved matches as fallback
-        return {"error":"GEMINI_API_KEY missing", "retrieved": matches}
+def cached_answer(key: tuple):
+    with _answer_cache_lock:
+        entry = _answer_cache.get(key)
+        if entry is None:
+            return None
+        expires_at, text = entry
+        if time.monotonic() >= expires_at:
+            del _answer_cache[key]
+            return None
+        _answer_cache.move_to_end(key)
+        return text
+
+def store_answer(key: tuple, text: str):
+    with _answer_cache_lock:
+        _answer_cache[key] = (time.monotonic() + Cq.ANSWER_CACHE_TTL, text)
+        _answer_cache.move_to_end(key)
+        while len(_answer_cache) > Cq.ANSWER_CACHE_SIZE:
+            _answer_cache.popitem(last=False)
 
-    model = genai.GenerativeModel(os.getenv("GENERATION_MODEL", "gemini-2.5-flash"))
-    response = model.generate_content(prompt)
+def clear_answer_cache():
+    """Drop cached answers, e.g. after the index has been rebuilt."""
+    with _answer_cache_lock:
+        _answer_cache.clear()
+
+def response_text(response) -> str:
     text = getattr(response, "text", None)
     if text is None:
         try:
@@ -125,6 +225,86 @@ def answer_question(question: str, top_k: int = Cq.TOP_K, namespace: str = "") -
             text = str(response)
     return text
 
+async def retrieve(reader: "PineconeReader", q_emb, top_k: int, namespace: Union[str, List[str]], filter=None):
+    # several namespaces are fanned out in parallel and merged by score
+    if isinstance(namespace, str):
+        return await reader.aquery(q_emb, top_k=top_k, namespace=namespace, filter=filter)
+    return await reader.aquery_many(q_emb, top_k=top_k, namespaces=namespace or [""], filter=filter)
+
+async def retrieve_for(question: str, top_k: int, namespace: Union[str, List[str]], filter=None) -> list:
+    # embed the query and get the pinecone reader concurrently (both may block on first use)
+    q_emb, reader = await asyncio.gather(
+        asyncio.to_thread(embed_query, question),
+        asyncio.to_thread(get_reader),
+    )
+
+    matches = await retrieve(reader, q_emb, top_k, namespace, filter)
+    if filter and not matches:
+        # vectors indexed without the filtered field (e.g. multi-row chunks) can't match; search unfiltered
+        matches = await retrieve(reader, q_emb, top_k, namespace)
+    return matches
+
+def clamp_top_k(top_k: int) -> int:
+    return max(1, min(top_k or Cq.TOP_K, Cq.MAX_TOP_K))
+
+def generation_model():
+    return genai.GenerativeModel(os.getenv("GENERATION_MODEL", "gemini-2.5-flash"))
+
+async def answer_question_async(question: str, top_k: int = Cq.TOP_K, namespace: Union[str, List[str]] = "",
+                                filter: dict = None) -> str:
+    top_k = clamp_top_k(top_k)
+    key = answer_cache_key(question, top_k, namespace, filter)
+    cached = cached_answer(key)
+    if cached is not None:
+        return cached
+
+    matches = await retrieve_for(question, top_k, namespace, filter)
+
+    # prepare prompt and call Gemini
+    prompt = build_prompt(question, matches)
+    if not Cq.GEMINI_API_KEY:
+        # If Gemini key missing, return the retrieved matches as fallback
+        return {"error":"GEMINI_API_KEY missing", "retrieved": matches}
+
+    response = await generation_model().generate_content_async(prompt)
+    text = response_text(response)
+    if text:
+        # an empty (e.g. safety-blocked) reply is returned but not cached, so the next ask retries Gemini
+        store_answer(key, text)
+    return text
+
+async def stream_answer_async(question: str, top_k: int = Cq.TOP_K, namespace: Union[str, List[str]] = "",
+                              filter: dict = None) -> AsyncIterator[str]:
+    """Like answer_question_async, but yields the answer text piece by piece as Gemini generates it.
+    Requires GEMINI_API_KEY (callers should use answer_question_async for the no-key fallback)."""
+    top_k = clamp_top_k(top_k)
+    key = answer_cache_key(question, top_k, namespace, filter)
+    cached = cached_answer(key)
+    if cached is not None:
+        yield cached
+        return
+
+    matches = await retrieve_for(question, top_k, namespace, filter)
+    prompt = build_prompt(question, matches)
+
+    response = await generation_model().generate_content_async(prompt, stream=True)
+    parts = []
+    async for chunk in response:
+        try:
+            text = chunk.text
+        except ValueError:
+            # chunks without text parts (e.g. only finish/safety info) have nothing to forward
+            continue
+        if text:
+            parts.append(text)
+            yield text
+    if parts:
+        store_answer(key, "".join(parts))
+
+def answer_question(question: str, top_k: int = Cq.TOP_K, namespace: Union[str, List[str]] = "",
+                    filter: dict = None) -> str:
+    return asyncio.run(answer_question_async(question, top_k=top_k, namespace=namespace, filter=filter))
+
 if __name__ == "__main__":
     demo_q = "Which state had most number of accidents and how much ?"
     print("Question:", demo_q)